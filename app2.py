@@ -1,16 +1,13 @@
 
 # app.py
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import datetime
 import re
-import numpy as np
 
 st.set_page_config(page_title="データバレーZ", layout="wide")
 
-# --- サイドバーをブルーに変更するCSS ---
-st.markdown("""
+# --- サイドバーをブルーに変更するCSS（1回の st.markdown でまとめて注入）---
+SIDEBAR_CSS = """
     <style>
     /* サイドバー全体の背景色 */
     [data-testid="stSidebar"] {
@@ -36,11 +33,7 @@ st.markdown("""
         background-color: #ffffff !important;
         color: #000000 !important;
     }
-    </style>
-""", unsafe_allow_html=True)
 
-st.markdown("""
-    <style>
     /* --- サイドバーの file_uploader だけ文字色を黒にする --- */
     [data-testid="stSidebar"] [data-testid="stFileUploader"] * {
         color: #000000 !important;       /* ← 黒文字に強制 */
@@ -57,7 +50,8 @@ st.markdown("""
         color: #000000 !important;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(SIDEBAR_CSS, unsafe_allow_html=True)
 
 
 REQUIRED_COLS = ["rally_no", "player", "skill", "detail", "point_to"]
@@ -151,6 +145,9 @@ DETAIL_EXPLANATION = {
 
 @st.cache_data
 def load_data(file):
+    # pandas は初回表示を遅らせないよう、使う関数の中で import する
+    import pandas as pd
+
     # 余分な行は読み飛ばす
     df = pd.read_csv(file, on_bad_lines="skip")
     missing = [c for c in REQUIRED_COLS if c not in df.columns]
@@ -166,6 +163,8 @@ def load_data(file):
         st.warning(f"定義外コードの行が {len(bad)} 件あります。CSVを修正してください。")
     return df
 
+SAMPLE_CSV = "data/20260112新人戦_日下ブラック1セット目.csv"
+
 def kpi(df):
     total = len(df)
     pts   = (df["point_to"] == "U").sum()
@@ -292,7 +291,7 @@ with st.sidebar:
     if uploaded:
         df = load_data(uploaded)
     elif use_sample:
-        df = load_data("data/20260112新人戦_日下ブラック1セット目.csv")
+        df = load_data(SAMPLE_CSV)
     else:
         st.stop()
 
@@ -321,6 +320,7 @@ qdf = apply_filters(df)
 
 def _to_player_no(val):
     # 'No.1', 'NO1', '1' などから数字のみ抽出。取れない場合はNaN
+    import numpy as np
     s = str(val)
     m = re.search(r'(\d+)', s)
     return int(m.group(1)) if m else np.nan
@@ -328,6 +328,7 @@ def _to_player_no(val):
 qdf["player_no"] = qdf["player"].apply(_to_player_no)
 
 def _display_name(no):
+    import pandas as pd
     if pd.isna(no):
         return str(no)
     no = int(no)
@@ -380,194 +381,167 @@ with col_left:
         player_names[i] = st.text_input(f"No{i} の名前", value="", key=key)
 
 
-# ===== 可視化用の図（レポート出力でも再利用）=====
-
-# ラベル化用にコピー
-qs = qdf.copy()
-qs["skill_label"] = qs["skill"].map(SKILL_LABELS)
-
-# --- 1) 選手別・得点（Uカウント） ---
-
-gp_points = qdf.groupby("player_display")["point_to"] \
-               .apply(lambda s: (s == "U").sum()).reset_index(name="points_U")
-
-fig_player_points = px.bar(
-    gp_points, x="player_display", y="points_U",
-    title="選手別 得点数（U）",
-    labels={"points_U": "得点数（U）", "player_display": "選手"},
-    category_orders={"player_display": PLAYER_ORDER_LABELS}
-)
-
-
-
-# --- 2) 選手別 × スキル別・得点（U）積み上げ ---
-qs = qdf.copy()
-qs["skill_label"] = qs["skill"].map(SKILL_LABELS)
-udf = qs[qs["point_to"] == "U"].copy()
-
-gp_points_stacked = udf.groupby(["player_display", "skill_label"]) \
-                       .size().reset_index(name="count")
-
-fig_player_points_stacked = px.bar(
-    gp_points_stacked, x="player_display", y="count",
-    color="skill_label", barmode="stack",
-    title="選手別 × スキル別 得点数（U）積み上げ",
-    labels={"count": "得点数（U）", "player_display": "選手", "skill_label": "スキル"},
-    color_discrete_map=SKILL_COLORS,
-    category_orders={"player_display": PLAYER_ORDER_LABELS, "skill_label": SKILL_ORDER}
-)
-fig_player_points_stacked.update_layout(legend_title_text="スキル")
-
-
-
-# --- 3) 選手別・失点（Oカウント） ---
-gp_losses = qdf.groupby("player_display")["point_to"] \
-               .apply(lambda s: (s == "O").sum()).reset_index(name="points_O")
-
-fig_player_losses = px.bar(
-    gp_losses, x="player_display", y="points_O",
-    title="選手別 失点数（O）",
-    labels={"points_O": "失点数（O）", "player_display": "選手"},
-    category_orders={"player_display": PLAYER_ORDER_LABELS}
-)
-
-
-
-# --- 4) 選手別 × スキル別・失点（O）積み上げ ---
-odf = qs[qs["point_to"] == "O"].copy()
-gp_losses_stacked = odf.groupby(["player_display", "skill_label"]) \
-                       .size().reset_index(name="count")
-
-fig_player_losses_stacked = px.bar(
-    gp_losses_stacked, x="player_display", y="count",
-    color="skill_label", barmode="stack",
-    title="選手別 × スキル別 失点数（O）積み上げ",
-    labels={"count": "失点数（O）", "player_display": "選手", "skill_label": "スキル"},
-    color_discrete_map=SKILL_COLORS,
-    category_orders={"player_display": PLAYER_ORDER_LABELS, "skill_label": SKILL_ORDER}
-)
-fig_player_losses_stacked.update_layout(legend_title_text="スキル")
-
-
-
-# --- 既存：スキル別／ディテール別 ---
-gs = qs.groupby("skill_label")["point_to"].apply(lambda s: (s == "U").sum()).reset_index(name="points_U")
-fig_skill = px.bar(gs, x="skill_label", y="points_U", title="スキル別 得点数（U）",
-                   labels={"points_U": "得点数（U）", "skill_label": "スキル"})
-
-# --- NEW: スキル別 × ディテール（質）の積み上げ棒グラフ ---
-# qdf はフィルタ適用後のデータ
-qd = qdf.copy()
-qd["skill_label"] = qd["skill"].map(SKILL_LABELS)
-
-# スキル × detail ごとの件数
-gs_detail = qd.groupby(["skill_label", "detail"]).size().reset_index(name="count")
+# ===== 集計（キャッシュ）=====
 
 # detail の表示順（A/B/C/M/P）を固定（任意）
 DETAIL_ORDER = ["A", "B", "C", "M", "P"]
 
-fig_skill_detail = px.bar(
-    gs_detail,
-    x="skill_label",
-    y="count",
-    color="detail",           # ← 質コードで色分け
-    barmode="stack",
-    title="スキル別 × ディテール（質）件数",
-    labels={"skill_label": "スキル", "count": "件数", "detail": "質"},
-    category_orders={"detail": DETAIL_ORDER}
-)
-
 # （任意）色の固定：A/B/C/M/P の配色ルールがあれば指定
 DETAIL_COLORS = {"A":"#1f77b4","B":"#2ca09a","C":"#ffef0e","M":"#d62728","P":"#9467bd"}
-fig_skill_detail.update_layout(legend_title_text="質（detail）")
-fig_skill_detail.for_each_trace(lambda t: t.update(marker_color=DETAIL_COLORS.get(t.name, t.marker.color)))
-
-
-# --- NEW: Sunburst（内=player / 中=skill / 外=detail）---
-sb = qdf.copy()
 
-# スキルの日本語ラベル列
-sb["skill_label"] = sb["skill"].map(SKILL_LABELS)
+# キーは選手名入力やフィルタで変わるため、メモリ上に件数を絞って保持する
+@st.cache_data(max_entries=32)
+def aggregate(qdf):
+    # グラフ用の集計表をまとめて作る（同じフィルタ結果なら再計算しない）
+    qs = qdf.copy()
+    qs["skill_label"] = qs["skill"].map(SKILL_LABELS)
+
+    # 選手別 × スキル別・得点（U）／失点（O）
+    udf = qs[qs["point_to"] == "U"]
+    odf = qs[qs["point_to"] == "O"]
+    points_stacked = udf.groupby(["player_display", "skill_label"]).size().reset_index(name="count")
+    losses_stacked = odf.groupby(["player_display", "skill_label"]).size().reset_index(name="count")
+
+    # スキル別 得点数／スキル別 × ディテール（質）件数
+    skill = qs.groupby("skill_label")["point_to"].apply(lambda s: (s == "U").sum()).reset_index(name="points_U")
+    skill_detail = qs.groupby(["skill_label", "detail"]).size().reset_index(name="count")
+
+    # Sunburst：件数（イベント数）を value に使うために全行を1とする列を用意
+    sunburst = qs.copy()
+    sunburst["count"] = 1
+
+    # タイムライン（U と O のみ。I は除外）：U=+1、O=-1
+    tl = qdf[qdf["point_to"].isin(["U", "O"])].copy()
+    tl = tl.sort_values("rally_no")
+    tl["y"] = tl["point_to"].map({"U": 1, "O": -1})
+
+    # I連続区間の検出
+    runs, current_start, prev_rally = [], None, None
+    for _, row in tl.iterrows():
+        r, p = row["rally_no"], row["point_to"]
+        if p == "I":
+            if current_start is None:
+                current_start = r
+            prev_rally = r
+        else:
+            if current_start is not None:
+                runs.append((current_start, prev_rally))
+                current_start = None
+    if current_start is not None:
+        runs.append((current_start, prev_rally))
+
+    return {
+        "points_stacked": points_stacked,
+        "losses_stacked": losses_stacked,
+        "skill": skill,
+        "skill_detail": skill_detail,
+        "sunburst": sunburst,
+        "timeline": tl,
+        "timeline_runs": runs,
+    }
 
-# 件数（イベント数）を value に使うために全行を1とする列を用意
-sb["count"] = 1
+agg = aggregate(qdf)
 
-# Sunburst作成
-fig_sunburst = px.sunburst(
-    sb,
-    path=["player_display", "skill_label", "detail"],   # ← 内周が名前に
-    values="count",
-    title="選手別ボール関与構造（選手名 → スキル → ディテール）",
-    color="detail",
-    color_discrete_map=DETAIL_COLORS
-)
-fig_sunburst.update_traces(
-    hovertemplate="層: %{label}<br>件数: %{value}<br>割合: %{percentRoot:.1%}"
-)
 
+# ===== 可視化用の図（レポート出力でも再利用）=====
 
-# ホバー表示の改善（選手・スキル・質・件数）
-fig_sunburst.update_traces(
-    hovertemplate=(
-        "層: %{label}<br>"
-        "件数: %{value}<br>"
-        "割合: %{percentRoot:.1%}<extra></extra>"
+def make_timeline_fig(agg):
+    import plotly.express as px
+    fig_timeline = px.line(
+        agg["timeline"],
+        x="rally_no",
+        y="y",
+        markers=True,
+        line_shape="linear",
+        title="タイムライン（得点=+1 / 失点=-1）",
+        labels={"rally_no": "ラリー番号", "y": "結果"}
     )
-)
-
-# Sunburst サイズ拡大（大きめに表示）
-fig_sunburst.update_layout(
-    width=900,    # 横幅 900px（必要なら 1000〜1200 に拡大可）
-    height=900,   # 高さ 900px（必要なら 1000 以上もOK）
-    margin=dict(t=80, l=10, r=10, b=10)
-)
 
-# --- タイムライン ---
+    fig_timeline.update_traces(marker=dict(size=12))  # ★ マーカーを4倍サイズに
 
-# --- タイムライン（U と O のみ。I は除外） ---
-tl = qdf[qdf["point_to"].isin(["U", "O"])].copy()
-tl = tl.sort_values("rally_no")
-
-# 数値へ変換：U=+1、O=-1
-tl["y"] = tl["point_to"].map({"U": 1, "O": -1})
-
-fig_timeline = px.line(
-    tl,
-    x="rally_no",
-    y="y",
-    markers=True,
-    line_shape="linear",
-    title="タイムライン（得点=+1 / 失点=-1）",
-    labels={"rally_no": "ラリー番号", "y": "結果"}
-)
-
-fig_timeline.update_traces(marker=dict(size=12))  # ★ マーカーを4倍サイズに
-
-fig_timeline.update_yaxes(
-    tickvals=[-1, 1],
-    ticktext=["失点(O)", "得点(U)"],
-    range=[-1.5, 1.5]
-)
+    fig_timeline.update_yaxes(
+        tickvals=[-1, 1],
+        ticktext=["失点(O)", "得点(U)"],
+        range=[-1.5, 1.5]
+    )
 
+    # I連続区間のハイライト
+    for (start_r, end_r) in agg["timeline_runs"]:
+        fig_timeline.add_vrect(x0=start_r, x1=end_r, fillcolor="LightGray", opacity=0.15, line_width=0,
+                               annotation_text="I（継続）", annotation_position="top left")
+    return fig_timeline
+
+def make_player_figs(agg, player_order):
+    import plotly.express as px
+    # --- 選手別 × スキル別・得点（U）積み上げ ---
+    fig_player_points_stacked = px.bar(
+        agg["points_stacked"], x="player_display", y="count",
+        color="skill_label", barmode="stack",
+        title="選手別 × スキル別 得点数（U）積み上げ",
+        labels={"count": "得点数（U）", "player_display": "選手", "skill_label": "スキル"},
+        color_discrete_map=SKILL_COLORS,
+        category_orders={"player_display": player_order, "skill_label": SKILL_ORDER}
+    )
+    fig_player_points_stacked.update_layout(legend_title_text="スキル")
+
+    # --- 選手別 × スキル別・失点（O）積み上げ ---
+    fig_player_losses_stacked = px.bar(
+        agg["losses_stacked"], x="player_display", y="count",
+        color="skill_label", barmode="stack",
+        title="選手別 × スキル別 失点数（O）積み上げ",
+        labels={"count": "失点数（O）", "player_display": "選手", "skill_label": "スキル"},
+        color_discrete_map=SKILL_COLORS,
+        category_orders={"player_display": player_order, "skill_label": SKILL_ORDER}
+    )
+    fig_player_losses_stacked.update_layout(legend_title_text="スキル")
+
+    # --- Sunburst（内=player / 中=skill / 外=detail）---
+    fig_sunburst = px.sunburst(
+        agg["sunburst"],
+        path=["player_display", "skill_label", "detail"],   # ← 内周が名前に
+        values="count",
+        title="選手別ボール関与構造（選手名 → スキル → ディテール）",
+        color="detail",
+        color_discrete_map=DETAIL_COLORS
+    )
 
+    # ホバー表示の改善（選手・スキル・質・件数）
+    fig_sunburst.update_traces(
+        hovertemplate=(
+            "層: %{label}<br>"
+            "件数: %{value}<br>"
+            "割合: %{percentRoot:.1%}<extra></extra>"
+        )
+    )
 
-# I連続区間の検出→ハイライト
-runs, current_start, prev_rally = [], None, None
-for _, row in tl.iterrows():
-    r, p = row["rally_no"], row["point_to"]
-    if p == "I":
-        if current_start is None:
-            current_start = r
-        prev_rally = r
-    else:
-        if current_start is not None:
-            runs.append((current_start, prev_rally))
-            current_start = None
-if current_start is not None:
-    runs.append((current_start, prev_rally))
-for (start_r, end_r) in runs:
-    fig_timeline.add_vrect(x0=start_r, x1=end_r, fillcolor="LightGray", opacity=0.15, line_width=0,
-                           annotation_text="I（継続）", annotation_position="top left")
+    # Sunburst サイズ拡大（大きめに表示）
+    fig_sunburst.update_layout(
+        width=900,    # 横幅 900px（必要なら 1000〜1200 に拡大可）
+        height=900,   # 高さ 900px（必要なら 1000 以上もOK）
+        margin=dict(t=80, l=10, r=10, b=10)
+    )
+    return fig_player_points_stacked, fig_player_losses_stacked, fig_sunburst
+
+def make_skill_figs(agg):
+    import plotly.express as px
+    # --- スキル別 得点数 ---
+    fig_skill = px.bar(agg["skill"], x="skill_label", y="points_U", title="スキル別 得点数（U）",
+                       labels={"points_U": "得点数（U）", "skill_label": "スキル"})
+
+    # --- スキル別 × ディテール（質）の積み上げ棒グラフ ---
+    fig_skill_detail = px.bar(
+        agg["skill_detail"],
+        x="skill_label",
+        y="count",
+        color="detail",           # ← 質コードで色分け
+        barmode="stack",
+        title="スキル別 × ディテール（質）件数",
+        labels={"skill_label": "スキル", "count": "件数", "detail": "質"},
+        category_orders={"detail": DETAIL_ORDER}
+    )
+    fig_skill_detail.update_layout(legend_title_text="質（detail）")
+    fig_skill_detail.for_each_trace(lambda t: t.update(marker_color=DETAIL_COLORS.get(t.name, t.marker.color)))
+    return fig_skill, fig_skill_detail
 
 
 # ===== 画面表示（タブ）=====
@@ -575,15 +549,17 @@ tab_timeline, tab_player, tab_skill, tab_help = st.tabs(
     ["タイムライン", "選手別", "スキル別", "説明やデータ作成手順など"]
 )
 with tab_timeline:
+    fig_timeline = make_timeline_fig(agg)
     st.plotly_chart(fig_timeline, use_container_width=True)
 with tab_player:
-    #st.plotly_chart(fig_player_points, use_container_width=True)
+    fig_player_points_stacked, fig_player_losses_stacked, fig_sunburst = \
+        make_player_figs(agg, PLAYER_ORDER_LABELS)
     st.plotly_chart(fig_player_points_stacked, use_container_width=True)
-    #st.plotly_chart(fig_player_losses, use_container_width=True)
     st.plotly_chart(fig_player_losses_stacked, use_container_width=True)
     st.plotly_chart(fig_sunburst, use_container_width=True)
 
 with tab_skill:
+    fig_skill, fig_skill_detail = make_skill_figs(agg)
     st.plotly_chart(fig_skill, use_container_width=True)
     st.plotly_chart(fig_skill_detail, use_container_width=True)
 with tab_help:
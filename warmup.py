@@ -0,0 +1,91 @@
+# warmup.py
+# サーバー起動直後のウォームアップ（`streamlit run app2.py` と並行して実行）
+#
+#   python warmup.py [--port 8501]
+#
+# - サーバーの起動（/_stcore/health）を待ち、WebSocket で1セッションを開いて
+#   app2.py をサンプルCSVで1回実行する
+# - 実行はサーバープロセス内で行われるため、pandas / plotly.express の import と
+#   load_data / aggregate のキャッシュがそのまま以降のセッションで再利用される
+# - 実行要求から「最初の要素」「タイトル」「スクリプト完了」までの時間を表示する
+#   （ウォームアップ前のサーバーに対して実行すれば、それが初回セッションの描画時間）
+import argparse
+import asyncio
+import sys
+import time
+import urllib.request
+
+HEALTH_TIMEOUT = 120  # サーバー起動待ちの上限（秒）
+RUN_TIMEOUT = 120     # スクリプト1回の実行待ちの上限（秒）
+
+
+def wait_for_server(port):
+    url = f"http://localhost:{port}/_stcore/health"
+    deadline = time.monotonic() + HEALTH_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as res:
+                if res.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+async def run_session(port):
+    import websockets
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ClientState_pb2 import ClientState
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    timings = {}
+    errors = []
+    url = f"ws://localhost:{port}/_stcore/stream"
+    async with websockets.connect(url, subprotocols=["streamlit"], max_size=None) as ws:
+        # ブラウザと同じく、接続後に「スクリプト実行」を要求する
+        rerun = BackMsg()
+        rerun.rerun_script.CopyFrom(ClientState())
+        t0 = time.perf_counter()
+        await ws.send(rerun.SerializeToString())
+
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(ws.recv(), RUN_TIMEOUT))
+            elapsed = time.perf_counter() - t0
+            kind = msg.WhichOneof("type")
+            if kind == "delta":
+                timings.setdefault("first_element", elapsed)
+                element = msg.delta.new_element.WhichOneof("type")
+                if element == "heading":
+                    timings.setdefault("title", elapsed)
+                elif element == "exception":
+                    errors.append(msg.delta.new_element.exception.message)
+            elif kind == "script_finished":
+                timings["finished"] = elapsed
+                return timings, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app2.py のウォームアップと初回描画時間の計測")
+    parser.add_argument("--port", type=int, default=8501)
+    args = parser.parse_args()
+
+    if not wait_for_server(args.port):
+        print(f"[warmup] 失敗: サーバー（port {args.port}）が起動しませんでした", file=sys.stderr)
+        return 1
+
+    timings, errors = asyncio.run(run_session(args.port))
+    if errors:
+        for e in errors:
+            print(f"[warmup] 失敗: {e}", file=sys.stderr)
+        return 1
+
+    print(f"[warmup] 最初の要素まで: {timings['first_element']:.2f}s")
+    print(f"[warmup] タイトル表示まで: {timings['title']:.2f}s")
+    print(f"[warmup] スクリプト完了まで: {timings['finished']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())